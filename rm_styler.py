@@ -1,13 +1,24 @@
-import json
+import codecs
 import pathlib
 import logging
-import re
+import functools
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, FrozenSet, List, Tuple, Union
 from aiohttp import web
 
 import server # Import ComfyUI Server to create API routes
 
+# Use orjson for faster style loading when available
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _loads(data: bytes) -> Any:
+        # Match orjson: UTF-8 only (json.loads would also sniff UTF-16/32)
+        return json.loads(data.decode('utf-8'))
+
 # Setup logging
 logger = logging.getLogger("RMStyler")
 
@@ -16,11 +27,18 @@ class Template:
     def __init__(self, prompt: str, negative_prompt: str, **kwargs: Any) -> None:
         self.prompt = prompt
         self.negative_prompt = negative_prompt
+        # Pre-split around {prompt} so weighting doesn't re-scan the template each run
+        self._parts = tuple(s.strip() for s in prompt.split('{prompt}'))
+        self._has_two = len(self._parts) == 2
 
     def replace_prompts(self, positive_prompt: str, negative_prompt: str) -> Tuple[str, str]:
         """Simple replacement (Legacy/Fast mode)."""
         pos_res = self.prompt.replace('{prompt}', positive_prompt)
-        neg_res = ', '.join(filter(None, (self.negative_prompt, negative_prompt)))
+        neg_res = negative_prompt
+        if self.negative_prompt and negative_prompt:
+            neg_res = f"{self.negative_prompt}, {negative_prompt}"
+        elif self.negative_prompt:
+            neg_res = self.negative_prompt
         return pos_res, neg_res
 
     def apply_weighted_style(self, current_positive: str, current_negative: str, 
@@ -29,38 +47,31 @@ class Template:
         Applies style with weighting. 
         If weight == 1.0, it avoids adding (style:1.0) syntax.
         """
-        
+        # Weight syntax is only needed when weight != 1.0; format it once per call
+        weighted = weight != 1.0
+        w_str = f"{round(weight, 2)}" if weighted else None
+
         # --- Positive Prompt Logic ---
         pos_result = current_positive
         
         if enable_pos:
-            # Split around {prompt} to weight only the style parts
-            parts = self.prompt.split('{prompt}')
-            
-            styled_parts = []
-            for part in parts:
-                part = part.strip()
-                if not part:
-                    styled_parts.append("")
-                    continue
-                
-                # Only apply weight syntax if strictly necessary
-                if weight != 1.0:
-                    styled_parts.append(f"({part}:{round(weight, 2)})")
-                else:
-                    styled_parts.append(part)
-
-            # Reassemble: Prefix + UserPrompt + Suffix
-            if len(parts) == 2:
+            if self._has_two:
                 # Standard case: "style_prefix {prompt} style_suffix"
-                components = [styled_parts[0], current_positive, styled_parts[1]]
-                pos_result = ' '.join(filter(None, components))
+                # Parts are pre-split and stripped, so weight == 1.0 uses them as-is
+                prefix, suffix = self._parts
+                if weighted:
+                    # Weight only the style parts, never the user prompt
+                    prefix = f"({prefix}:{w_str})" if prefix else ""
+                    suffix = f"({suffix}:{w_str})" if suffix else ""
+
+                # Reassemble: Prefix + UserPrompt + Suffix
+                pos_result = ' '.join([c for c in (prefix, current_positive, suffix) if c])
             else:
                 # Fallback for templates without {prompt} or multiple {prompt}s
                 # Wraps the entire replaced string if weighted
                 temp_res = self.prompt.replace('{prompt}', current_positive)
-                if weight != 1.0:
-                    pos_result = f"({temp_res}:{round(weight, 2)})"
+                if weighted:
+                    pos_result = f"({temp_res}:{w_str})"
                 else:
                     pos_result = temp_res
 
@@ -71,21 +82,54 @@ class Template:
             clean_neg = self.negative_prompt.strip()
             
             # Apply weight to the added negative style
-            if weight != 1.0:
-                clean_neg = f"({clean_neg}:{round(weight, 2)})"
+            if weighted:
+                clean_neg = f"({clean_neg}:{w_str})"
             
-            neg_result = ', '.join(filter(None, (clean_neg, current_negative)))
+            if clean_neg and current_negative:
+                neg_result = f"{clean_neg}, {current_negative}"
+            elif clean_neg:
+                neg_result = clean_neg
             
         return pos_result, neg_result
 
 
+def _parse_style_file(file_path: pathlib.Path) -> Tuple[str, List[Tuple[str, Dict[str, Any]]]]:
+    """Reads one style JSON file. Returns (group, [(name, template_kwargs), ...])."""
+    group = file_path.parent.name
+    try:
+        data = file_path.read_bytes()
+        # Strip a UTF-8 BOM so files load the same with or without orjson
+        if data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):]
+        content = _loads(data)
+        # Only keep entries Template can be built from, so menus never list unusable styles
+        entries = []
+        for t in content:
+            if not isinstance(t, dict):
+                logger.warning(f"Skipping non-object style entry in {file_path}: {t!r}")
+                continue
+            invalid = [k for k in ('name', 'prompt', 'negative_prompt') if not isinstance(t.get(k), str)]
+            if invalid:
+                logger.warning(f"Skipping style {t.get('name', '<unnamed>')!r} in {file_path}: missing or non-string {', '.join(invalid)}")
+                continue
+            entries.append((t['name'], t))
+        return group, entries
+    except Exception as e:
+        logger.error(f"Failed to load {file_path}: {e}")
+        return group, []
+
+
 class StylerData:
     """Singleton to manage loading style templates."""
     def __init__(self, datadir: pathlib.Path | None = None) -> None:
-        self._data: Dict[str, Dict[str, Template]] = defaultdict(dict)
-        self.category_map: Dict[str, List[str]] = defaultdict(list)
+        self._data: Dict[str, Dict[str, Template]] = defaultdict(dict)  # Built on first use
+        self._raw: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self.category_map: Dict[str, Tuple[str, ...]] = {}
+        self._flat_index: Dict[str, Tuple[str, str]] = {}  # "Category: Name" -> (Category, Name)
         self.all_styles_list: List[str] = []      # For Multi-node (Category: Name)
-        self.all_style_names: set = set()         # For Single-node validation (Name only)
+        self.all_style_names: FrozenSet[str] = frozenset()  # For Single-node validation (Name only)
+        self.sorted_categories: List[str] = []    # Pre-sorted for INPUT_TYPES
+        self.sorted_style_names: List[str] = []
 
         if datadir is None:
             datadir = pathlib.Path(__file__).parent / 'data'
@@ -94,34 +138,43 @@ class StylerData:
             logger.warning(f"Data directory not found: {datadir}")
             return
 
-        for file_path in sorted(datadir.glob('*/*.json')):
-            if file_path.name.startswith('.'): continue
-            try:
-                with file_path.open('r', encoding='utf-8') as f:
-                    content = json.load(f)
-                group = file_path.parent.name
-                for template in content:
-                    if 'name' in template and 'prompt' in template:
-                        t_name = template['name']
-                        self._data[group][t_name] = Template(**template)
-                        self.category_map[group].append(t_name)
-                        
-                        # Populate lists for validation
-                        self.all_styles_list.append(f"{group}: {t_name}")
-                        self.all_style_names.add(t_name)
-                        
-            except Exception as e:
-                logger.error(f"Failed to load {file_path}: {e}")
-                
-        self.all_styles_list.sort()
+        paths = [p for p in sorted(datadir.glob('*/*.json')) if not p.name.startswith('.')]
 
-    def get_template_by_flat_key(self, flat_key: str) -> Template | None:
-        if not flat_key or flat_key == "None": return None
-        try:
-            group, name = flat_key.split(": ", 1)
-            return self._data[group][name]
-        except (ValueError, KeyError):
-            return None
+        category_lists: Dict[str, List[str]] = defaultdict(list)
+        style_names = set()
+
+        # Only names are indexed here; Template objects are created lazily by _get()
+        for group, entries in map(_parse_style_file, paths):
+            for t_name, template in entries:
+                self._raw[group][t_name] = template
+                self._flat_index[f"{group}: {t_name}"] = (group, t_name)
+                category_lists[group].append(t_name)
+                
+                # Populate set for validation
+                style_names.add(t_name)
+                
+        # Read-only from here on
+        self.all_style_names = frozenset(style_names)
+        self.category_map = {k: tuple(v) for k, v in category_lists.items()}
+        self.all_styles_list = sorted(self._flat_index)
+        self.sorted_categories = sorted(self.category_map)
+        self.sorted_style_names = sorted(self.all_style_names)
+
+    def _get(self, group: str, name: str) -> Template | None:
+        """Returns the Template for group/name, constructing and caching it on first access."""
+        tmpl = self._data.get(group, {}).get(name)
+        if tmpl is None:
+            raw = self._raw.get(group, {}).get(name)
+            if raw is None:
+                return None
+            # Entries are validated at load time, so construction can't fail here
+            tmpl = self._data[group][name] = Template(**raw)
+        return tmpl
+
+    def get_template_by_flat_key(self, flat_key: str | None) -> Template | None:
+        # None / "None" / malformed keys are simply absent from the index
+        key = self._flat_index.get(flat_key)
+        return self._get(*key) if key else None
 
 styler_data = StylerData()
 
@@ -131,29 +184,72 @@ async def get_styler_data(request):
     return web.json_response(styler_data.category_map)
 
 
+# Shared option specs, reused by every node/slot (read-only for ComfyUI)
+_TEXT_SPEC = ("STRING", {"default": "", "multiline": True})
+_BASE_WEIGHT_SPEC = ("FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0, "step": 0.1})
+_WEIGHT_SPEC = ("FLOAT", {"default": 1.0, "min": 0.1, "max": 10.0, "step": 0.1})
+_POS_BOOL = ("BOOLEAN", {"default": True, "label_on": "Pos: On", "label_off": "Pos: Off"})
+_NEG_BOOL = ("BOOLEAN", {"default": True, "label_on": "Neg: On", "label_off": "Neg: Off"})
+_LOG_BOOL = ("BOOLEAN", {"default": True, "label_on": "Yes", "label_off": "No"})
+
+
+# --- INPUT_TYPES ---
+# Built once and shared: the style lists are fixed after load and ComfyUI treats
+# the schema as read-only. Call .cache_clear() if styler_data is ever reloaded.
+
+@functools.lru_cache(maxsize=None)
+def _single_input_types() -> Dict[str, Any]:
+    categories = styler_data.sorted_categories
+    
+    # VALIDATION FIX: 
+    # We populate 'style' with ALL possible style names from ALL categories.
+    # This ensures that when JS sets the value to "Neon", the backend validates it as a known option.
+    all_styles = styler_data.sorted_style_names
+    
+    return {
+        "required": {
+            "text_positive": _TEXT_SPEC,
+            "text_negative": _TEXT_SPEC,
+            "category": (categories, ), 
+            "style": (all_styles, ),  # <--- FIXED HERE
+            "weight": _BASE_WEIGHT_SPEC,
+            "log_prompt": _LOG_BOOL,
+        },
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _input_types_for(slot_count: int) -> Dict[str, Any]:
+    style_spec = (["None"] + styler_data.all_styles_list, {"default": "None"})
+    
+    inputs = {
+        "required": {
+            "text_positive": _TEXT_SPEC,
+            "text_positive_weight": _BASE_WEIGHT_SPEC,
+            "text_negative": _TEXT_SPEC,
+            "text_negative_weight": _BASE_WEIGHT_SPEC,
+        }
+    }
+    
+    # Dynamically create inputs based on slot_count
+    for i in range(1, slot_count + 1):
+        inputs["required"][f"style_{i}"] = style_spec
+        inputs["required"][f"style_{i}_weight"] = _WEIGHT_SPEC
+        inputs["required"][f"style_{i}_pos_on"] = _POS_BOOL
+        inputs["required"][f"style_{i}_neg_on"] = _NEG_BOOL
+
+    inputs["required"]["log_prompt"] = _LOG_BOOL
+    
+    return inputs
+
+
 class RMStyler:
     """
     Styler with Dynamic JS update and Prompt Weighting.
     """
     @classmethod
     def INPUT_TYPES(cls) -> Dict[str, Any]:
-        categories = sorted(list(styler_data.category_map.keys()))
-        
-        # VALIDATION FIX: 
-        # We populate 'style' with ALL possible style names from ALL categories.
-        # This ensures that when JS sets the value to "Neon", the backend validates it as a known option.
-        all_styles = sorted(list(styler_data.all_style_names))
-        
-        return {
-            "required": {
-                "text_positive": ("STRING", {"default": "", "multiline": True}),
-                "text_negative": ("STRING", {"default": "", "multiline": True}),
-                "category": (categories, ), 
-                "style": (all_styles, ),  # <--- FIXED HERE
-                "weight": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0, "step": 0.1}),
-                "log_prompt": ("BOOLEAN", {"default": True, "label_on": "Yes", "label_off": "No"}),
-            },
-        }
+        return _single_input_types()
 
     RETURN_TYPES = ('STRING', 'STRING',)
     RETURN_NAMES = ('text_positive', 'text_negative',)
@@ -161,17 +257,13 @@ class RMStyler:
     CATEGORY = 'RM Nodes/Styler'
 
     def prompt_styler(self, text_positive: str, text_negative: str, category: str, style: str, weight: float, log_prompt: bool) -> Tuple[str, str]:
-        # Validation checks
-        if category not in styler_data._data:
+        # Single lookup on the combined key. The style input lists styles from ALL
+        # categories, so this also checks the style belongs to THIS category.
+        template = styler_data.get_template_by_flat_key(f"{category}: {style}")
+        if template is None:
+            if category in styler_data._raw and style not in styler_data._raw[category]:
+                logger.warning(f"Style '{style}' not found in category '{category}'. Skipping.")
             return text_positive, text_negative
-            
-        # Even though validation passed, we must check if the style belongs to THIS category
-        # because the input list contains styles from ALL categories.
-        if style not in styler_data._data[category]:
-            logger.warning(f"Style '{style}' not found in category '{category}'. Skipping.")
-            return text_positive, text_negative
-
-        template = styler_data._data[category][style]
         
         pos, neg = template.apply_weighted_style(
             current_positive=text_positive,
@@ -181,11 +273,11 @@ class RMStyler:
             weight=weight
         )
 
-        pos = re.sub(r'\s+', ' ', pos).strip()
-        neg = re.sub(r'\s+', ' ', neg).strip()
+        pos = ' '.join(pos.split())
+        neg = ' '.join(neg.split())
 
         if log_prompt:
-            print(f"[RMStyler] Applied: {category} -> {style} (w={weight})")
+            logger.info("[RMStyler] Applied: %s -> %s (w=%s)", category, style, weight)
 
         return pos, neg
 
@@ -195,29 +287,21 @@ class RMStylerMultiBase:
     
     _slot_count = 6 # Default, overridden by subclasses
 
+    @classmethod
+    def _get_slot_keys(cls) -> Tuple[Tuple[str, str, str, str], ...]:
+        """Input names per slot, Max Slot -> 1. Built once per class and cached."""
+        keys = cls.__dict__.get("_slot_keys")
+        if keys is None:
+            keys = tuple(
+                (f"style_{i}", f"style_{i}_weight", f"style_{i}_pos_on", f"style_{i}_neg_on")
+                for i in range(cls._slot_count, 0, -1)
+            )
+            cls._slot_keys = keys
+        return keys
+
     @classmethod
     def INPUT_TYPES(cls) -> Dict[str, Any]:
-        style_options = ["None"] + styler_data.all_styles_list
-        
-        inputs = {
-            "required": {
-                "text_positive": ("STRING", {"default": "", "multiline": True}),
-                "text_positive_weight": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0, "step": 0.1}),
-                "text_negative": ("STRING", {"default": "", "multiline": True}),
-                "text_negative_weight": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0, "step": 0.1}),
-            }
-        }
-        
-        # Dynamically create inputs based on _slot_count
-        for i in range(1, cls._slot_count + 1):
-            inputs["required"][f"style_{i}"] = (style_options, {"default": "None"})
-            inputs["required"][f"style_{i}_weight"] = ("FLOAT", {"default": 1.0, "min": 0.1, "max": 10.0, "step": 0.1})
-            inputs["required"][f"style_{i}_pos_on"] = ("BOOLEAN", {"default": True, "label_on": "Pos: On", "label_off": "Pos: Off"})
-            inputs["required"][f"style_{i}_neg_on"] = ("BOOLEAN", {"default": True, "label_on": "Neg: On", "label_off": "Neg: Off"})
-
-        inputs["required"]["log_prompt"] = ("BOOLEAN", {"default": True, "label_on": "Yes", "label_off": "No"})
-        
-        return inputs
+        return _input_types_for(cls._slot_count)
 
     RETURN_TYPES = ('STRING', 'STRING',)
     RETURN_NAMES = ('text_positive', 'text_negative',)
@@ -239,16 +323,20 @@ class RMStylerMultiBase:
 
         # Iterate Styles in REVERSE (Max Slot -> 1)
         # Inner-most style is applied first (Max Slot), Outer-most last (Slot 1)
-        for i in range(self._slot_count, 0, -1):
-            style_key = kwargs.get(f"style_{i}")
+        for sk, wk, pk, nk in self._get_slot_keys():
+            style_key = kwargs.get(sk)
             
             if style_key and style_key != "None":
                 template = styler_data.get_template_by_flat_key(style_key)
                 
                 if template:
-                    weight = kwargs.get(f"style_{i}_weight", 1.0)
-                    pos_on = kwargs.get(f"style_{i}_pos_on", True)
-                    neg_on = kwargs.get(f"style_{i}_neg_on", True)
+                    weight = kwargs.get(wk, 1.0)
+                    pos_on = kwargs.get(pk, True)
+                    neg_on = kwargs.get(nk, True)
+                    
+                    # Slot fully disabled: nothing to apply
+                    if not pos_on and not neg_on:
+                        continue
                     
                     pos, neg = template.apply_weighted_style(
                         current_positive=pos,
@@ -259,15 +347,15 @@ class RMStylerMultiBase:
                     )
 
         # Cleanup
-        pos = re.sub(r'\s+', ' ', pos).strip()
-        pos = re.sub(r'\s,\s', ', ', pos)
+        pos = ' '.join(pos.split())
+        pos = pos.replace(' , ', ', ')
         pos = pos.replace(' . . ', ' . ')
-        neg = re.sub(r'\s+', ' ', neg).strip()
-        neg = re.sub(r'\s,\s', ', ', neg)
+        neg = ' '.join(neg.split())
+        neg = neg.replace(' , ', ', ')
 
         if log_prompt:
-            print(f"[{self.__class__.__name__}] Final Pos: {pos}")
-            print(f"[{self.__class__.__name__}] Final Neg: {neg}")
+            name = self.__class__.__name__
+            logger.info("[%s] Final Pos: %s\n[%s] Final Neg: %s", name, pos, name, neg)
 
         return pos, neg
 